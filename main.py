@@ -11,17 +11,37 @@ YouTube Shorts Creator
 import os
 import sys
 import json
+import re
+import bisect
+import subprocess
+import tempfile
 import argparse
 import logging
+import queue
+import threading
+import sqlite3
+import hashlib
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from multiprocessing.connection import AuthenticationError, Client, Listener
+from contextlib import closing
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 # Импорты для работы с видео и ИИ
 try:
     import yt_dlp
-    import whisper
+    import blake3
+    import ctranslate2
+    from faster_whisper import WhisperModel
     import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    import numpy as np
+    import orjson
     from colorama import init, Fore, Back, Style
     import ffmpeg
     from tqdm import tqdm
@@ -30,9 +50,263 @@ except ImportError as e:
     print("📦 Установите зависимости: pip install -r requirements.txt")
     sys.exit(1)
 
+# Опциональные зависимости для GPU-транскрипции через HuggingFace
+try:
+    import torch
+    from transformers import pipeline
+    from transformers.utils import is_flash_attn_2_available
+    HF_ASR_AVAILABLE = True
+except ImportError:
+    HF_ASR_AVAILABLE = False
+
+# Опциональный JIT-компилятор для циклов по сегментам
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
 # Инициализация colorama для кроссплатформенной поддержки цветов
 init(autoreset=True)
 
+# Размер in-memory LRU для ответов Ollama
+OLLAMA_MEMORY_CACHE_SIZE = 512
+
+# VAD-фильтр faster-whisper: пропускает тишину и сокращает объем декодирования
+WHISPER_VAD_FILTER = True
+
+# Ключ из ранних версий config.json: известен всем, использовать нельзя
+_PLACEHOLDER_AUTHKEY = 'shorts-creator'
+
+# Таблица замены недопустимых в именах файлов символов
+_BAD_CHARS_TABLE = str.maketrans({c: '_' for c in '<>:"/\\|?*'})
+
+# JSON-блок в ответе ИИ
+_JSON_BLOCK_RE = re.compile(r'\{.*\}', re.DOTALL)
+
+def _blake3_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Потоковый BLAKE3-хеш содержимого файла"""
+    hasher = blake3.blake3()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def _server_authkey(server_config: Dict, create: bool = False) -> bytes:
+    """Ключ аутентификации сервера: из конфигурации или из файла с правами 0600
+    
+    Пустой server.authkey означает, что ключ хранится в server.authkey_file;
+    при create=True отсутствующий файл создается со случайным ключом.
+    """
+    authkey = server_config.get('authkey', '')
+    if authkey:
+        if authkey == _PLACEHOLDER_AUTHKEY:
+            raise ValueError("server.authkey содержит общеизвестное значение по умолчанию — задайте свой ключ")
+        return authkey.encode('utf-8')
+    
+    key_file = os.path.expanduser(server_config['authkey_file'])
+    if not os.path.exists(key_file):
+        if not create:
+            raise ValueError(f"файл ключа {key_file} не найден — сначала запустите сервер (--serve)")
+        os.makedirs(os.path.dirname(key_file) or '.', mode=0o700, exist_ok=True)
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(secrets.token_hex(32))
+    
+    with open(key_file, 'r', encoding='utf-8') as f:
+        authkey = f.read().strip()
+    if not authkey:
+        raise ValueError(f"файл ключа {key_file} пуст")
+    return authkey.encode('utf-8')
+
+def _cpu_flags() -> set:
+    """Флаги возможностей процессора из /proc/cpuinfo (только Linux)"""
+    try:
+        with open('/proc/cpuinfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('flags'):
+                    return set(line.partition(':')[2].split())
+    except OSError:
+        pass
+    return set()
+
+def _fast_file_fp(path: str, sample_size: int = 65536) -> str:
+    """Стабильный отпечаток файла: BLAKE3 от начала, конца и размера"""
+    st = os.stat(path)
+    hasher = blake3.blake3()
+    with open(path, 'rb') as f:
+        hasher.update(f.read(sample_size))
+        f.seek(-min(sample_size, st.st_size), os.SEEK_END)
+        hasher.update(f.read())
+    hasher.update(st.st_size.to_bytes(8, 'little'))
+    return hasher.hexdigest()[:16]
+
+def _encode_segment(video_path: str, start_time: float, end_time: float, output_file: str,
+                    crf: int, preset: str, threads: int) -> str:
+    """Перекодирование одного сегмента видео в отдельный файл"""
+    (
+        ffmpeg
+        .input(video_path, ss=start_time, t=end_time - start_time)
+        .output(
+            output_file,
+            vcodec='libx264',
+            acodec='aac',
+            **{'crf': str(crf), 'preset': preset, 'threads': threads}
+        )
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    return output_file
+
+def _encode_segments_single_pass(video_path: str, segments: List[Tuple[float, float, str]],
+                                 crf: int, preset: str, threads: int,
+                                 on_progress: Optional[Callable[[float], None]] = None) -> List[str]:
+    """Перекодирование нескольких сегментов одним процессом ffmpeg с общим входом"""
+    argv = ['ffmpeg', '-y', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1', '-i', video_path]
+    for start_time, end_time, output_file in segments:
+        argv += [
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-ss', str(start_time), '-t', str(end_time - start_time),
+            '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+            '-c:a', 'aac', '-threads', str(threads),
+            output_file
+        ]
+    
+    # stderr пишется во временный файл: при чтении stdout до EOF заполненный
+    # канал stderr (например, ошибки декодирования) заблокировал бы ffmpeg
+    with tempfile.TemporaryFile(mode='w+', encoding='utf-8', errors='replace') as stderr_file:
+        process = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=stderr_file, text=True)
+        for line in process.stdout:
+            # Строки прогресса вида out_time_us=12345678
+            key, _, value = line.strip().partition('=')
+            if on_progress and key == 'out_time_us' and value.isdigit():
+                on_progress(int(value) / 1_000_000)
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            stderr = stderr_file.read()
+            raise RuntimeError(f"ffmpeg завершился с кодом {process.returncode}: {stderr.strip()[-500:]}")
+    return [output_file for _, _, output_file in segments]
+
+def _copy_segment(video_path: str, start_time: float, end_time: float, output_file: str) -> str:
+    """Нарезка сегмента без перекодирования (stream copy)"""
+    (
+        ffmpeg
+        .input(video_path, ss=start_time, t=end_time - start_time)
+        .output(output_file, c='copy', avoid_negative_ts='make_zero')
+        .overwrite_output()
+        .run(quiet=True)
+    )
+    return output_file
+
+def _probe_keyframes(video_path: str) -> List[float]:
+    """Временные метки ключевых кадров видеопотока (по пакетам, без декодирования)"""
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path
+        ],
+        capture_output=True, text=True, check=True
+    )
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    keyframes.sort()
+    return keyframes
+
+def _stream_codecs(probe: Dict) -> Tuple[Optional[str], Optional[str]]:
+    """Кодеки первых видео- и аудиопотоков из результата ffprobe"""
+    video_codec = next((s.get('codec_name') for s in probe['streams'] if s['codec_type'] == 'video'), None)
+    audio_codec = next((s.get('codec_name') for s in probe['streams'] if s['codec_type'] == 'audio'), None)
+    return video_codec, audio_codec
+
+def _as_numeric(values: list) -> np.ndarray:
+    """Числовой массив; строки вида "10" приводятся к float"""
+    arr = np.asarray(values)
+    if arr.dtype.kind not in 'iuf':
+        arr = arr.astype(float)
+    return arr
+
+def _as_score(value) -> float:
+    """Оценка релевантности; нечисловые значения и None заменяются на 0.5"""
+    try:
+        score = float(value)
+    except (TypeError, ValueError):
+        return 0.5
+    return score if np.isfinite(score) else 0.5
+
+def _segments_to_soa(segments: List[Dict]) -> Tuple[np.ndarray, np.ndarray, List[str], np.ndarray]:
+    """Список сегментов-словарей -> параллельные массивы (starts, ends, descs, scores)"""
+    starts = _as_numeric([s.get('start_time', 0) for s in segments])
+    ends = _as_numeric([s.get('end_time', 0) for s in segments])
+    descs = [s.get('description', '') for s in segments]
+    scores = np.array([_as_score(s.get('relevance_score')) for s in segments], dtype=float)
+    return starts, ends, descs, scores
+
+def _soa_to_dicts(starts: np.ndarray, ends: np.ndarray, descs: List[str], scores: np.ndarray) -> List[Dict]:
+    """Параллельные массивы -> список сегментов-словарей с обычными типами Python"""
+    return [
+        {
+            'start_time': start,
+            'end_time': end,
+            'description': desc,
+            'relevance_score': score
+        }
+        for start, end, desc, score in zip(starts.tolist(), ends.tolist(), descs, scores.tolist())
+    ]
+
+def _non_overlapping(starts: np.ndarray, ends: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """Индексы непересекающихся сегментов; при пересечении остаются более релевантные"""
+    order = np.argsort(starts, kind='stable')
+    if len(order) < 2 or np.all(np.maximum.accumulate(ends[order][:-1]) <= starts[order][1:]):
+        return np.arange(len(starts))
+    
+    keep = []
+    for i in np.argsort(-scores, kind='stable'):
+        if np.all((ends[i] <= starts[keep]) | (starts[i] >= ends[keep])):
+            keep.append(i)
+    return np.sort(np.array(keep, dtype=int))
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _fallback_bounds(duration, segment_duration, min_duration):
+        """Границы сегментов равномерного деления длиной не меньше min_duration"""
+        n = (duration + segment_duration - 1) // segment_duration
+        starts = np.empty(n, np.int64)
+        ends = np.empty(n, np.int64)
+        k = 0
+        for i in range(0, duration, segment_duration):
+            end = min(i + segment_duration, duration)
+            if end - i >= min_duration:
+                starts[k] = i
+                ends[k] = end
+                k += 1
+        return starts[:k], ends[:k]
+    
+    @njit(cache=True)
+    def _valid_mask(starts, ends, duration, min_duration):
+        """Маска сегментов, лежащих внутри видео и не короче min_duration"""
+        mask = np.empty(starts.shape[0], np.bool_)
+        for i in range(starts.shape[0]):
+            mask[i] = starts[i] >= 0 and ends[i] <= duration and ends[i] - starts[i] >= min_duration
+        return mask
+    
+    # Компиляция при импорте (с cache=True — один раз, далее загрузка из кэша)
+    _fallback_bounds(1, 1, 1)
+    _valid_mask(np.zeros(1), np.zeros(1), 1.0, 1.0)
+else:
+    def _fallback_bounds(duration: int, segment_duration: int, min_duration: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Границы сегментов равномерного деления длиной не меньше min_duration"""
+        starts = np.arange(0, duration, segment_duration)
+        ends = np.minimum(starts + segment_duration, duration)
+        mask = ends - starts >= min_duration
+        return starts[mask], ends[mask]
+    
+    def _valid_mask(starts: np.ndarray, ends: np.ndarray, duration: float, min_duration: float) -> np.ndarray:
+        """Маска сегментов, лежащих внутри видео и не короче min_duration"""
+        return (starts >= 0) & (ends <= duration) & (ends - starts >= min_duration)
+
 class ShortsCreator:
     """Основной класс для создания коротких роликов из YouTube видео"""
     
@@ -44,17 +318,29 @@ class ShortsCreator:
         self.setup_directories()
         self.print_banner()
         self.whisper_model = None
+        self.asr = None
+        self._ollama_memory = OrderedDict()
+        self._ollama_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._http = self._create_http_session()
         
         # Статистика обработки
         self.stats = {
             "start_time": datetime.now(),
             "videos_processed": 0,
             "shorts_created": 0,
-            "errors": 0
+            "errors": 0,
+            "ollama_cache_hits": 0,
+            "ollama_cache_misses": 0
         }
         
         self.logger.info(f"🚀 {self.config['app']['name']} v{self.config['app']['version']} запущен")
     
+    def _inc_stat(self, key: str, value: int = 1):
+        """Потокобезопасное увеличение счетчика статистики"""
+        with self._stats_lock:
+            self.stats[key] += value
+    
     def _load_config(self, config_path: str) -> Dict:
         """Загрузка конфигурации из JSON файла"""
         try:
@@ -86,6 +372,26 @@ class ShortsCreator:
                 print(f"⚠️ Ошибка при загрузке прокси: {e}")
         return None
     
+    def _create_http_session(self) -> requests.Session:
+        """HTTP-сессия с keep-alive и повторами для запросов к Ollama"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            # Повторяем только ошибки соединения и 5xx: POST с истекшим таймаутом
+            # чтения заставил бы Ollama генерировать ответ заново
+            max_retries=Retry(
+                total=2,
+                read=0,
+                backoff_factor=0.3,
+                status_forcelist=[500, 502, 503, 504],
+                allowed_methods=frozenset({'POST'})
+            )
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
     def setup_logging(self):
         """Настройка системы логирования"""
         log_config = self.config['logging']
@@ -144,7 +450,10 @@ class ShortsCreator:
         # Настройки для yt-dlp
         ydl_opts = {
             'format': f'best[height<={self.config["video"]["video_quality"][:-1]}]',
-            'outtmpl': os.path.join(self.config['paths']['temp_dir'], '%(title)s.%(ext)s'),
+            'paths': {'home': self.config['paths']['temp_dir']},
+            'outtmpl': '%(title)s.%(ext)s',
+            # Слишком короткие видео отбрасываются до скачивания
+            'match_filter': yt_dlp.utils.match_filter_func(f"duration >= {self.config['video']['min_short_duration']}"),
             'writesubtitles': True,
             'writeautomaticsub': True,
             'subtitleslangs': ['ru', 'en'],
@@ -196,8 +505,11 @@ class ShortsCreator:
                         self.logger.info("🔄 Без cookies")
                     
                     with yt_dlp.YoutubeDL(current_opts) as ydl:
-                        # Получение информации о видео
-                        info = ydl.extract_info(url, download=False)
+                        # Получение информации и скачивание за один проход
+                        info = ydl.extract_info(url, download=True)
+                        if info:
+                            downloads = info.get('requested_downloads') or [{}]
+                            file_path = downloads[0].get('filepath') or ydl.prepare_filename(info)
                         break  # Если успешно, выходим из цикла
                         
                 except Exception as e:
@@ -236,55 +548,34 @@ class ShortsCreator:
                 self.logger.warning("⚠️ Видео слишком короткое для создания shorts")
                 return None
             
-            # Скачивание видео с теми же настройками
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
-                
-            # Поиск скачанного файла
-            temp_dir = Path(self.config['paths']['temp_dir'])
-            
-            # Попробуем несколько паттернов поиска
-            search_patterns = [
-                f"*{video_info['id']}*",
-                f"*{video_info['title'][:20]}*" if video_info['title'] else None,
-                "*.mp4", "*.webm", "*.mkv", "*.avi"
-            ]
-            
-            video_files = []
-            for pattern in search_patterns:
-                if pattern:
-                    files = list(temp_dir.glob(pattern))
-                    if files:
-                        video_files = files
-                        break
-            
-            if video_files:
-                # Берем самый новый файл
-                video_file = max(video_files, key=lambda f: f.stat().st_mtime)
-                video_info['file_path'] = str(video_file)
-                self.logger.info(f"✅ Видео скачано: {video_info['file_path']}")
-                return video_info
-            else:
+            if not os.path.exists(file_path):
                 self.logger.error("❌ Не удалось найти скачанный файл")
-                self.logger.debug(f"Искали в директории: {temp_dir}")
+                self.logger.debug(f"Ожидаемый путь: {file_path}")
                 return None
+            
+            video_info['file_path'] = file_path
+            
+            # Кодеки нужны для нарезки без перекодирования
+            try:
+                video_info['video_codec'], video_info['audio_codec'] = _stream_codecs(self._probe(file_path))
+            except ffmpeg.Error as e:
+                self.logger.debug(f"Не удалось определить кодеки: {e}")
+            
+            self.logger.info(f"✅ Видео скачано: {video_info['file_path']}")
+            return video_info
                     
         except Exception as e:
             self.logger.error(f"❌ Ошибка при скачивании видео: {e}")
-            self.stats['errors'] += 1
+            self._inc_stat('errors')
             return None
     
     def _process_local_file(self, file_path: str) -> Optional[Dict]:
         """Обработка локального видеофайла"""
         self.logger.info(f"📁 Обрабатываем локальный файл: {file_path}")
         
-        if not os.path.exists(file_path):
-            self.logger.error(f"❌ Файл не найден: {file_path}")
-            return None
-        
         # Получаем информацию о видео с помощью ffmpeg
         try:
-            probe = ffmpeg.probe(file_path)
+            probe = self._probe(file_path)
             video_stream = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
             
             if not video_stream:
@@ -296,7 +587,7 @@ class ShortsCreator:
             title = os.path.splitext(filename)[0]
             
             video_info = {
-                'id': f"local_{hash(file_path)}",
+                'id': f"local_{_fast_file_fp(file_path)}",
                 'title': title,
                 'duration': duration,
                 'description': f"Локальный файл: {filename}",
@@ -304,6 +595,7 @@ class ShortsCreator:
                 'upload_date': None,
                 'file_path': file_path
             }
+            video_info['video_codec'], video_info['audio_codec'] = _stream_codecs(probe)
             
             # Проверка критически важных полей
             if not video_info['duration'] or not video_info['title']:
@@ -323,53 +615,303 @@ class ShortsCreator:
             self.logger.error(f"❌ Ошибка при анализе локального файла: {e}")
             return None
     
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _probe_cached(path: str, mtime: int, size: int) -> Dict:
+        """ffprobe с кэшированием по (путь, время изменения, размер)"""
+        return ffmpeg.probe(path)
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _probe_keyframes_cached(path: str, mtime: int, size: int) -> List[float]:
+        """Ключевые кадры с кэшированием по (путь, время изменения, размер)"""
+        return _probe_keyframes(path)
+    
+    def _probe(self, path: str) -> Dict:
+        """Информация о медиафайле без повторного запуска ffprobe для того же файла"""
+        st = os.stat(path)
+        return self._probe_cached(path, st.st_mtime_ns, st.st_size)
+    
     def extract_audio_and_subtitles(self, video_info: Dict) -> Dict:
         """Извлечение аудио и субтитров из видео"""
+        audio_path = self.extract_audio(video_info)
+        if not audio_path:
+            return {}
+        return self.transcribe_audio(audio_path)
+    
+    def extract_audio(self, video_info: Dict) -> Optional[str]:
+        """Извлечение аудиодорожки в WAV 16 кГц для транскрипции"""
         self.logger.info("🎵 Извлекаем аудио для анализа")
         
         if 'file_path' not in video_info or not video_info['file_path']:
             self.logger.error("❌ Отсутствует путь к видеофайлу")
-            return {}
+            return None
         
         video_path = video_info['file_path']
         
         if not os.path.exists(video_path):
             self.logger.error(f"❌ Видеофайл не найден: {video_path}")
-            return {}
+            return None
         
-        audio_path = os.path.join(self.config['paths']['temp_dir'], f"{video_info['id']}_audio.wav")
+        if self.config['cache']['audio']:
+            # Ключ кэша аудио: путь, время изменения и размер исходного видео
+            st = os.stat(video_path)
+            key_source = f"{os.path.abspath(video_path)}|{st.st_mtime_ns}|{st.st_size}"
+            audio_key = blake3.blake3(key_source.encode('utf-8')).hexdigest()[:16]
+            audio_path = str(Path(self.config['paths']['cache_dir']) / f"audio_{audio_key}.wav")
+            
+            if os.path.exists(audio_path):
+                self.logger.info(f"♻️ Аудио взято из кэша: {audio_path}")
+                return audio_path
+        else:
+            audio_path = os.path.join(self.config['paths']['temp_dir'], f"{video_info['id']}_audio.wav")
         
         try:
-            # Извлечение аудио с помощью ffmpeg
+            # Извлечение аудио с помощью ffmpeg во временный файл,
+            # чтобы прерванный запуск не оставил в кэше битый WAV
+            partial_path = f"{audio_path}.part"
             (
                 ffmpeg
                 .input(video_path)
-                .output(audio_path, acodec='pcm_s16le', ac=1, ar='16000')
+                .output(partial_path, format='wav', acodec='pcm_s16le', ac=1, ar='16000')
                 .overwrite_output()
                 .run(quiet=True)
             )
+            os.replace(partial_path, audio_path)
             
             self.logger.info(f"✅ Аудио извлечено: {audio_path}")
+            return audio_path
             
-            # Транскрипция с помощью Whisper
-            if not self.whisper_model:
-                self.logger.info("🤖 Загружаем модель Whisper...")
-                self.whisper_model = whisper.load_model(self.config['ai']['whisper']['model'])
+        except Exception as e:
+            self.logger.error(f"❌ Ошибка при извлечении аудио: {e}")
+            self._inc_stat('errors')
+            return None
+    
+    def transcribe_audio(self, audio_path: str) -> Dict:
+        """Транскрипция аудио с кэшированием результата на диске"""
+        try:
+            cache_file = None
+            if self.config['cache']['transcriptions']:
+                # Ключ: содержимое аудио, модель и все параметры, влияющие на результат
+                settings = self._asr_settings()
+                model_name = self._sanitize_filename(settings['model'])
+                settings_hash = blake3.blake3(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+                cache_file = (Path(self.config['paths']['cache_dir']) /
+                              f"{_blake3_file(audio_path)}_{model_name}_{settings_hash}.json")
+                if cache_file.exists():
+                    try:
+                        with open(cache_file, 'r', encoding='utf-8') as f:
+                            cached = json.load(f)
+                        self.logger.info("♻️ Транскрипция взята из кэша")
+                        return {
+                            'audio_path': audio_path,
+                            'transcription': cached['transcription'],
+                            'segments': cached['segments']
+                        }
+                    except (json.JSONDecodeError, KeyError, TypeError) as e:
+                        # Поврежденная запись считается промахом кэша
+                        self.logger.warning(f"⚠️ Поврежденная запись кэша транскрипции {cache_file.name}: {e}")
+                        cache_file.unlink(missing_ok=True)
             
             self.logger.info("📝 Выполняем транскрипцию...")
-            result = self.whisper_model.transcribe(audio_path)
+            transcription, segments = self._transcribe(audio_path)
+            
+            if cache_file:
+                # Запись через временный файл; ошибка записи не должна терять результат
+                partial_file = cache_file.with_name(f"{cache_file.name}.part")
+                try:
+                    with open(partial_file, 'w', encoding='utf-8') as f:
+                        json.dump({'transcription': transcription, 'segments': segments}, f, ensure_ascii=False)
+                    os.replace(partial_file, cache_file)
+                except OSError as e:
+                    self.logger.warning(f"⚠️ Не удалось сохранить транскрипцию в кэш: {e}")
+                    partial_file.unlink(missing_ok=True)
             
             return {
                 'audio_path': audio_path,
-                'transcription': result['text'],
-                'segments': result['segments']
+                'transcription': transcription,
+                'segments': segments
             }
             
         except Exception as e:
-            self.logger.error(f"❌ Ошибка при извлечении аудио: {e}")
-            self.stats['errors'] += 1
+            self.logger.error(f"❌ Ошибка при транскрипции: {e}")
+            self._inc_stat('errors')
             return {}
     
+    def _use_hf_pipeline(self) -> bool:
+        """Доступна ли транскрипция через HF pipeline на GPU"""
+        return HF_ASR_AVAILABLE and torch.cuda.is_available()
+    
+    def _hf_model_name(self) -> str:
+        """Модель HF pipeline с учетом языка (англоязычные distil-модели только для en)"""
+        whisper_config = self.config['ai']['whisper']
+        return whisper_config['hf_model_by_language'].get(whisper_config['language'], whisper_config['hf_model'])
+    
+    def _asr_model_name(self) -> str:
+        """Имя модели, которая будет использована для транскрипции"""
+        return self._hf_model_name() if self._use_hf_pipeline() else self.config['ai']['whisper']['model']
+    
+    def _asr_settings(self) -> Dict:
+        """Параметры транскрипции, от которых зависит результат (для ключа кэша)"""
+        whisper_config = self.config['ai']['whisper']
+        settings = {
+            'model': self._asr_model_name(),
+            'language': whisper_config['language'],
+            'task': whisper_config['task']
+        }
+        if self._use_hf_pipeline():
+            settings.update(backend='hf', compute_type='float16', vad_filter=False)
+        else:
+            settings.update(backend='faster-whisper', compute_type=self._whisper_compute_type()[1],
+                            vad_filter=WHISPER_VAD_FILTER)
+        return settings
+    
+    def _whisper_compute_type(self) -> Tuple[str, str]:
+        """Выбор устройства и типа вычислений для faster-whisper"""
+        compute_type = self.config['ai']['whisper']['compute_type']
+        
+        if ctranslate2.get_cuda_device_count() > 0:
+            return "cuda", "int8_float16" if compute_type == "auto" else compute_type
+        
+        if compute_type != "auto":
+            return "cpu", compute_type
+        
+        # На CPU используем INT8: VNNI ускоряет int8-умножения, а AMX
+        # (Sapphire Rapids+) позволяет задействовать int8_bfloat16
+        flags = _cpu_flags()
+        if 'amx_int8' in flags and 'int8_bfloat16' in ctranslate2.get_supported_compute_types("cpu"):
+            return "cpu", "int8_bfloat16"
+        if not flags & {'avx512_vnni', 'avx_vnni'}:
+            self.logger.debug("CPU без VNNI: INT8 будет работать медленнее")
+        return "cpu", "int8"
+    
+    def _load_asr_model(self):
+        """Ленивая загрузка модели распознавания речи"""
+        if self._use_hf_pipeline():
+            if not self.asr:
+                self.logger.info("🤖 Загружаем модель Whisper (HF pipeline, FP16)...")
+                attn = "flash_attention_2" if is_flash_attn_2_available() else "sdpa"
+                self.asr = pipeline(
+                    "automatic-speech-recognition",
+                    self._hf_model_name(),
+                    torch_dtype=torch.float16,
+                    device="cuda:0",
+                    model_kwargs={"attn_implementation": attn}
+                )
+        elif not self.whisper_model:
+            self.logger.info("🤖 Загружаем модель Whisper...")
+            device, compute_type = self._whisper_compute_type()
+            self.logger.info(f"⚙️ faster-whisper: {device}, {compute_type}")
+            self.whisper_model = WhisperModel(
+                self.config['ai']['whisper']['model'],
+                device=device,
+                compute_type=compute_type,
+                cpu_threads=os.cpu_count() or 0,
+                num_workers=1
+            )
+    
+    def warmup_asr_model(self):
+        """Загрузка модели и прогон секунды тишины, чтобы первый запрос не платил за инициализацию"""
+        self._load_asr_model()
+        self.logger.info("🔥 Прогреваем модель Whisper...")
+        silence = np.zeros(16000, dtype=np.float32)
+        if self._use_hf_pipeline():
+            self.asr({'raw': silence, 'sampling_rate': 16000})
+        else:
+            # Без VAD-фильтра, иначе тишина будет отброшена до запуска модели
+            segments_iter, _ = self.whisper_model.transcribe(silence, beam_size=1)
+            list(segments_iter)
+    
+    def serve(self) -> bool:
+        """Резидентный режим: принимает задания по локальному сокету, модель остается загруженной"""
+        server_config = self.config['server']
+        address = (server_config['host'], server_config['port'])
+        
+        # Listener распаковывает pickle от клиента, поэтому без секретного ключа не запускаемся
+        try:
+            authkey = _server_authkey(server_config, create=True)
+        except (ValueError, OSError) as e:
+            self.logger.error(f"❌ Сервер не запущен: {e}")
+            return False
+        
+        self.warmup_asr_model()
+        
+        with Listener(address, authkey=authkey) as listener:
+            self.logger.info(f"📡 Ожидаем задания на {address[0]}:{address[1]}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError) as e:
+                    self.logger.warning(f"⚠️ Отклонено подключение: {e}")
+                    continue
+                
+                with conn:
+                    try:
+                        message = conn.recv()
+                        inputs = message.get('inputs') or [message['input']]
+                    except (EOFError, OSError, AttributeError, KeyError, TypeError) as e:
+                        self.logger.warning(f"⚠️ Некорректное задание: {e}")
+                        continue
+                    
+                    self.logger.info(f"📨 Получено заданий: {len(inputs)}")
+                    counters = ('videos_processed', 'shorts_created', 'errors')
+                    before = {key: self.stats[key] for key in counters}
+                    
+                    if len(inputs) == 1:
+                        success = self.process_video(inputs[0])
+                    else:
+                        success = self.process_videos(inputs) == len(inputs)
+                    
+                    try:
+                        conn.send({
+                            'success': success,
+                            'stats': {key: self.stats[key] - before[key] for key in counters},
+                            'output_dir': self.config['paths']['output_dir']
+                        })
+                    except OSError as e:
+                        self.logger.warning(f"⚠️ Не удалось отправить ответ клиенту: {e}")
+    
+    def _transcribe(self, audio_path: str) -> Tuple[str, List[Dict]]:
+        """Транскрипция аудио: HF pipeline на GPU или faster-whisper"""
+        whisper_config = self.config['ai']['whisper']
+        language = None if whisper_config['language'] == 'auto' else whisper_config['language']
+        
+        self._load_asr_model()
+        
+        # На CUDA используем HF pipeline с FP16 и батчингом чанков
+        if self._use_hf_pipeline():
+            # Англоязычные (.en) модели не принимают language/task
+            generate_kwargs = {}
+            if getattr(self.asr.model.generation_config, 'is_multilingual', True):
+                generate_kwargs = {'language': language, 'task': whisper_config['task']}
+            out = self.asr(
+                audio_path,
+                chunk_length_s=30,
+                batch_size=whisper_config['batch_size'],
+                return_timestamps=True,
+                generate_kwargs=generate_kwargs
+            )
+            segments = []
+            for chunk in out.get('chunks', []):
+                start, end = chunk['timestamp']
+                segments.append({
+                    'start': start,
+                    'end': end if end is not None else start,
+                    'text': chunk['text']
+                })
+            return out['text'], segments
+        
+        # Транскрипция с помощью faster-whisper (CTranslate2)
+        segments_iter, info = self.whisper_model.transcribe(
+            audio_path,
+            language=language,
+            task=whisper_config['task'],
+            beam_size=1,
+            vad_filter=WHISPER_VAD_FILTER
+        )
+        segments = [{'start': s.start, 'end': s.end, 'text': s.text} for s in segments_iter]
+        return ''.join(s['text'] for s in segments), segments
+    
     def analyze_content_with_ai(self, video_info: Dict, audio_data: Dict) -> List[Dict]:
         """Анализ контента с помощью ИИ для определения лучших моментов"""
         self.logger.info("🧠 Анализируем контент с помощью ИИ...")
@@ -392,6 +934,12 @@ class ShortsCreator:
             if response:
                 # Парсинг ответа ИИ для получения временных меток
                 segments = self._parse_ai_response(response, video_info['duration'])
+                if not segments:
+                    self._evict_ollama_response(prompt)
+                    if segments is None:
+                        return self._create_fallback_segments(video_info['duration'])
+                else:
+                    self._cache_ollama_response(prompt, response)
                 self.logger.info(f"✅ ИИ предложил {len(segments)} сегментов для shorts")
                 return segments
             else:
@@ -400,7 +948,7 @@ class ShortsCreator:
                 
         except Exception as e:
             self.logger.error(f"❌ Ошибка при анализе ИИ: {e}")
-            self.stats['errors'] += 1
+            self._inc_stat('errors')
             return self._create_fallback_segments(video_info['duration'])
     
     def _create_analysis_prompt(self, content: Dict) -> str:
@@ -431,17 +979,52 @@ class ShortsCreator:
 - Оценивай релевантность от 0 до 1
         """
     
+    def _ollama_key(self, prompt: str) -> str:
+        """Ключ кэша ответа Ollama: SHA-256 от модели и промпта"""
+        return hashlib.sha256((self.config['ai']['ollama']['model'] + "\0" + prompt).encode('utf-8')).hexdigest()
+    
+    def _cache_ollama_response(self, prompt: str, response: str):
+        """Сохранение ответа в кэш; вызывается только после успешного разбора ответа"""
+        if self.config['cache']['ollama']:
+            self._ollama_cache_put(self._ollama_key(prompt), self.config['ai']['ollama']['model'], response)
+    
+    def _evict_ollama_response(self, prompt: str):
+        """Удаление неразобранного ответа из кэша (в том числе сохраненного ранее)"""
+        if not self.config['cache']['ollama']:
+            return
+        key = self._ollama_key(prompt)
+        with self._ollama_lock:
+            self._ollama_memory.pop(key, None)
+        try:
+            with closing(self._ollama_cache_db()) as conn, conn:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            self.logger.warning(f"⚠️ Ошибка записи в кэш Ollama: {e}")
+    
     def _query_ollama(self, prompt: str) -> Optional[str]:
-        """Запрос к Ollama API"""
+        """Запрос к Ollama API с чтением из кэша ответов
+        
+        Новые ответы не кэшируются здесь: вызывающий код сохраняет их через
+        _cache_ollama_response, когда ответ успешно разобран.
+        """
         ollama_config = self.config['ai']['ollama']
         
+        if self.config['cache']['ollama']:
+            cached = self._ollama_cache_get(self._ollama_key(prompt))
+            if cached is not None:
+                self._inc_stat('ollama_cache_hits')
+                self.logger.debug("♻️ Ответ Ollama взят из кэша")
+                return cached
+            self._inc_stat('ollama_cache_misses')
+        
         try:
-            response = requests.post(
+            response = self._http.post(
                 f"{ollama_config['base_url']}/api/generate",
                 json={
                     'model': ollama_config['model'],
                     'prompt': prompt,
-                    'stream': False
+                    'stream': False,
+                    'options': {'num_predict': ollama_config['max_tokens']}
                 },
                 timeout=ollama_config['timeout']
             )
@@ -459,51 +1042,91 @@ class ShortsCreator:
             self.logger.error(f"❌ Ошибка при запросе к Ollama: {e}")
             return None
     
-    def _parse_ai_response(self, response: str, video_duration: int) -> List[Dict]:
-        """Парсинг ответа ИИ"""
+    def _ollama_cache_db(self) -> sqlite3.Connection:
+        """Подключение к персистентному кэшу ответов Ollama"""
+        conn = sqlite3.connect(Path(self.config['paths']['cache_dir']) / 'ollama.db')
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at TEXT)"
+        )
+        return conn
+    
+    def _ollama_cache_get(self, key: str) -> Optional[str]:
+        """Поиск ответа в памяти, затем в SQLite"""
+        with self._ollama_lock:
+            if key in self._ollama_memory:
+                self._ollama_memory.move_to_end(key)
+                return self._ollama_memory[key]
+        
+        try:
+            with closing(self._ollama_cache_db()) as conn:
+                row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            self.logger.warning(f"⚠️ Ошибка чтения кэша Ollama: {e}")
+            return None
+        
+        if row:
+            self._remember_ollama_response(key, row[0])
+            return row[0]
+        return None
+    
+    def _ollama_cache_put(self, key: str, model: str, response: str):
+        """Сохранение ответа в памяти и в SQLite"""
+        self._remember_ollama_response(key, response)
+        try:
+            with closing(self._ollama_cache_db()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                    (key, model, response, datetime.now().isoformat())
+                )
+        except sqlite3.Error as e:
+            self.logger.warning(f"⚠️ Ошибка записи в кэш Ollama: {e}")
+    
+    def _remember_ollama_response(self, key: str, response: str):
+        """Сохранение ответа в in-memory LRU"""
+        with self._ollama_lock:
+            self._ollama_memory[key] = response
+            self._ollama_memory.move_to_end(key)
+            if len(self._ollama_memory) > OLLAMA_MEMORY_CACHE_SIZE:
+                self._ollama_memory.popitem(last=False)
+    
+    def _parse_ai_response(self, response: str, video_duration: int) -> Optional[List[Dict]]:
+        """Парсинг ответа ИИ; None, если ответ не удалось разобрать"""
         try:
             # Попытка извлечь JSON из ответа
-            import re
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
+            json_match = _JSON_BLOCK_RE.search(response)
             
             if json_match:
                 data = json.loads(json_match.group())
-                segments = data.get('segments', [])
+                starts, ends, descs, scores = _segments_to_soa(data.get('segments', []))
                 
                 # Валидация и фильтрация сегментов
-                valid_segments = []
-                for segment in segments:
-                    if (segment.get('start_time', 0) >= 0 and 
-                        segment.get('end_time', 0) <= video_duration and
-                        segment.get('end_time', 0) - segment.get('start_time', 0) >= self.config['video']['min_short_duration']):
-                        valid_segments.append(segment)
+                mask = _valid_mask(starts.astype(np.float64), ends.astype(np.float64), float(video_duration),
+                                   float(self.config['video']['min_short_duration']))
+                valid = np.flatnonzero(mask)
+                
+                # Удаление пересекающихся сегментов, максимум 5 сегментов
+                keep = valid[_non_overlapping(starts[valid], ends[valid], scores[valid])][:5]
+                keep = keep[np.argsort(starts[keep], kind='stable')]
                 
-                return valid_segments[:5]  # Максимум 5 сегментов
+                return _soa_to_dicts(starts[keep], ends[keep], [descs[i] for i in keep], scores[keep])
             
         except Exception as e:
             self.logger.warning(f"⚠️ Не удалось распарсить ответ ИИ: {e}")
         
-        return self._create_fallback_segments(video_duration)
+        return None
     
     def _create_fallback_segments(self, duration: int) -> List[Dict]:
         """Создание сегментов по умолчанию при ошибке ИИ"""
         self.logger.info("📐 Создаем сегменты равномерным делением")
         
-        segment_duration = self.config['video']['max_short_duration']
-        segments = []
-        duration = int(duration)  # Преобразуем в int для range()
-        
-        for i in range(0, duration, segment_duration):
-            end_time = min(i + segment_duration, duration)
-            if end_time - i >= self.config['video']['min_short_duration']:
-                segments.append({
-                    'start_time': i,
-                    'end_time': end_time,
-                    'description': f'Сегмент {len(segments) + 1}',
-                    'relevance_score': 0.5
-                })
-        
-        return segments
+        starts, ends = _fallback_bounds(
+            int(duration),
+            int(self.config['video']['max_short_duration']),
+            int(self.config['video']['min_short_duration'])
+        )
+        descs = [f'Сегмент {i + 1}' for i in range(len(starts))]
+        return _soa_to_dicts(starts, ends, descs, np.full(len(starts), 0.5))
     
     def create_shorts(self, video_info: Dict, segments: List[Dict]) -> List[str]:
         """Создание коротких роликов из сегментов"""
@@ -513,8 +1136,6 @@ class ShortsCreator:
         
         self.logger.info(f"✂️ Создаем {len(segments)} коротких роликов...")
         
-        output_files = []
-        
         if 'file_path' not in video_info or not video_info['file_path']:
             self.logger.error("❌ Отсутствует путь к видеофайлу")
             return []
@@ -529,45 +1150,101 @@ class ShortsCreator:
         output_dir = Path(self.config['paths']['output_dir']) / self._sanitize_filename(video_info['title'])
         output_dir.mkdir(parents=True, exist_ok=True)
         
-        for i, segment in enumerate(tqdm(segments, desc="Создание shorts")):
+        # Проверка корректности данных сегментов до запуска кодирования
+        jobs = []
+        for i, segment in enumerate(segments):
+            if not isinstance(segment, dict) or 'start_time' not in segment or 'end_time' not in segment:
+                self.logger.error(f"❌ Некорректные данные сегмента {i+1}")
+                self._inc_stat('errors')
+                continue
+            
+            start_time = segment['start_time']
+            end_time = segment['end_time']
+            
+            if start_time >= end_time or start_time < 0:
+                self.logger.error(f"❌ Некорректное время сегмента {i+1}: {start_time}-{end_time}")
+                self._inc_stat('errors')
+                continue
+            
+            jobs.append((i, start_time, end_time, output_dir / f"short_{i+1:03d}.mp4"))
+        
+        if not jobs:
+            return []
+        
+        video_config = self.config['video']
+        processing_config = self.config['processing']
+        encoder_args = (video_config['crf'], video_config['encoder_preset'], processing_config['ffmpeg_threads'])
+        
+        # Если исходник уже H.264/AAC, сегменты, начинающиеся рядом с ключевым
+        # кадром, нарезаются копированием потоков без перекодирования
+        keyframes = []
+        if (video_config['stream_copy'] and video_info.get('video_codec') == 'h264'
+                and video_info.get('audio_codec') == 'aac'):
             try:
-                # Проверка корректности данных сегмента
-                if not isinstance(segment, dict) or 'start_time' not in segment or 'end_time' not in segment:
-                    self.logger.error(f"❌ Некорректные данные сегмента {i+1}")
-                    self.stats['errors'] += 1
-                    continue
-                
-                start_time = segment['start_time']
-                end_time = segment['end_time']
-                
-                if start_time >= end_time or start_time < 0:
-                    self.logger.error(f"❌ Некорректное время сегмента {i+1}: {start_time}-{end_time}")
-                    self.stats['errors'] += 1
-                    continue
-                
-                output_file = output_dir / f"short_{i+1:03d}.mp4"
-                
-                # Нарезка видео с помощью ffmpeg
-                (
-                    ffmpeg
-                    .input(video_path, ss=start_time, t=end_time - start_time)
-                    .output(
-                        str(output_file),
-                        vcodec='libx264',
-                        acodec='aac',
-                        **{'crf': '23', 'preset': 'medium'}
-                    )
-                    .overwrite_output()
-                    .run(quiet=True)
-                )
-                
-                output_files.append(str(output_file))
-                self.logger.info(f"✅ Создан short: {output_file.name}")
-                self.stats['shorts_created'] += 1
-                
-            except Exception as e:
-                self.logger.error(f"❌ Ошибка при создании short {i+1}: {e}")
-                self.stats['errors'] += 1
+                st = os.stat(video_path)
+                keyframes = self._probe_keyframes_cached(video_path, st.st_mtime_ns, st.st_size)
+            except (subprocess.CalledProcessError, OSError, ValueError) as e:
+                self.logger.warning(f"⚠️ Не удалось получить ключевые кадры: {e}")
+        
+        # Каждая задача: вызов ffmpeg и список (индекс, файл) сегментов, которые он создает
+        tasks = []
+        encode_jobs = []
+        for i, start_time, end_time, output_file in jobs:
+            k = bisect.bisect_right(keyframes, start_time) - 1
+            if k >= 0 and start_time - keyframes[k] <= video_config['keyframe_tolerance']:
+                # Фактическое начало нарезки — ключевой кадр; метаданные должны ему соответствовать
+                segments[i]['start_time'] = keyframes[k]
+                tasks.append(((_copy_segment, video_path, keyframes[k], end_time, str(output_file)), [(i, output_file)]))
+            else:
+                encode_jobs.append((i, start_time, end_time, output_file))
+        
+        progress_bar = None
+        if video_config['single_pass_encode'] and len(encode_jobs) > 1:
+            # Один процесс ffmpeg: входной файл демультиплексируется и декодируется один раз
+            # out_time_us — время выходного потока: каждый выход начинается с 0,
+            # поэтому прогресс ограничен длительностью самого длинного сегмента
+            total = max(end_time - start_time for _, start_time, end_time, _ in encode_jobs)
+            progress_bar = tqdm(total=total, desc="Кодирование за один проход", unit="с", leave=False)
+            
+            def on_progress(seconds: float):
+                progress_bar.update(min(seconds, total) - progress_bar.n)
+            
+            tasks.append((
+                (_encode_segments_single_pass, video_path,
+                 [(start_time, end_time, str(output_file)) for _, start_time, end_time, output_file in encode_jobs],
+                 *encoder_args, on_progress),
+                [(i, output_file) for i, _, _, output_file in encode_jobs]
+            ))
+        else:
+            for i, start_time, end_time, output_file in encode_jobs:
+                tasks.append(((_encode_segment, video_path, start_time, end_time, str(output_file), *encoder_args),
+                              [(i, output_file)]))
+        
+        # Сегменты независимы: кодируем их параллельно отдельными процессами ffmpeg
+        results = {}
+        max_workers = min(len(tasks), processing_config['max_concurrent_jobs'])
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(*call): outputs for call, outputs in tasks}
+            
+            with tqdm(total=len(jobs), desc="Создание shorts") as pbar:
+                for future in as_completed(futures):
+                    outputs = futures[future]
+                    try:
+                        future.result()
+                        for i, output_file in outputs:
+                            results[i] = str(output_file)
+                            self.logger.info(f"✅ Создан short: {output_file.name}")
+                    except Exception as e:
+                        for i, _ in outputs:
+                            self.logger.error(f"❌ Ошибка при создании short {i+1}: {e}")
+                        self._inc_stat('errors', len(outputs))
+                    pbar.update(len(outputs))
+        
+        if progress_bar:
+            progress_bar.close()
+        
+        self._inc_stat('shorts_created', len(results))
+        output_files = [results[i] for i in sorted(results)]
         
         return output_files
     
@@ -578,10 +1255,16 @@ class ShortsCreator:
         metadata_dir = Path(self.config['paths']['output_dir']) / self._sanitize_filename(video_info['title']) / 'metadata'
         metadata_dir.mkdir(exist_ok=True)
         
-        for i, (segment, output_file) in enumerate(zip(segments, output_files)):
+        pairs = list(zip(segments, output_files))
+        single_file = self.config['features']['single_metadata_file']
+        all_metadata = []
+        
+        # Названия и описания для всех shorts одним запросом к ИИ
+        titles_descs = self._generate_all_metadata(video_info, [segment for segment, _ in pairs])
+        
+        for i, (segment, output_file) in enumerate(pairs):
             try:
-                # Генерация названия и описания через ИИ
-                title, description = self._generate_short_metadata(video_info, segment)
+                title, description = titles_descs[i]
                 
                 metadata = {
                     'original_video': {
@@ -602,14 +1285,85 @@ class ShortsCreator:
                     'generator': f"{self.config['app']['name']} v{self.config['app']['version']}"
                 }
                 
+                if single_file:
+                    all_metadata.append(metadata)
+                    continue
+                
                 metadata_file = metadata_dir / f"short_{i+1:03d}_metadata.json"
-                with open(metadata_file, 'w', encoding='utf-8') as f:
-                    json.dump(metadata, f, ensure_ascii=False, indent=2)
+                metadata_file.write_bytes(orjson.dumps(metadata, option=orjson.OPT_INDENT_2))
                 
                 self.logger.debug(f"📄 Метаданные сохранены: {metadata_file.name}")
                 
             except Exception as e:
                 self.logger.error(f"❌ Ошибка при генерации метаданных для short {i+1}: {e}")
+        
+        if single_file and all_metadata:
+            # Один файл вместо отдельного на каждый short
+            metadata_file = metadata_dir / "metadata_all.json"
+            try:
+                metadata_file.write_bytes(orjson.dumps(all_metadata, option=orjson.OPT_INDENT_2))
+                self.logger.debug(f"📄 Метаданные сохранены: {metadata_file.name}")
+            except Exception as e:
+                self.logger.error(f"❌ Ошибка при сохранении метаданных: {e}")
+    
+    def _generate_all_metadata(self, video_info: Dict, segments: List[Dict]) -> List[Tuple[str, str]]:
+        """Генерация названий и описаний для всех shorts одним запросом к ИИ"""
+        if not segments or not self.config['features']['auto_generate_titles']:
+            return [self._generate_short_metadata(video_info, segment) for segment in segments]
+        
+        fragments = "\n".join(
+            f"{i + 1}. {segment.get('description', '')} ({segment['start_time']}-{segment['end_time']} сек)"
+            for i, segment in enumerate(segments)
+        )
+        prompt = f"""
+Создай привлекательные названия и описания для коротких роликов из одного видео:
+
+Исходное видео: {video_info['title']}
+Фрагменты:
+{fragments}
+
+Верни результат в формате JSON со следующей структурой:
+{{
+  "shorts": [
+    {{
+      "index": 1,
+      "title": "Короткое цепляющее название",
+      "description": "Краткое описание до 100 символов"
+    }}
+  ]
+}}
+
+Требования:
+- Верни ровно {len(segments)} элементов, по одному на каждый фрагмент
+- Поле index соответствует номеру фрагмента
+        """
+        
+        results: List[Optional[Tuple[str, str]]] = [None] * len(segments)
+        try:
+            response = self._query_ollama(prompt)
+            json_match = _JSON_BLOCK_RE.search(response) if response else None
+            if json_match:
+                for item in json.loads(json_match.group()).get('shorts', []):
+                    index = int(item.get('index', 0)) - 1
+                    if 0 <= index < len(segments) and item.get('title'):
+                        results[index] = (
+                            str(item['title']).strip(),
+                            str(item.get('description') or segments[index].get('description', '')).strip()
+                        )
+        except Exception as e:
+            self.logger.warning(f"⚠️ Не удалось распарсить пакетные метаданные: {e}")
+        
+        # Для пропущенных фрагментов — отдельные запросы
+        missing = [i for i, result in enumerate(results) if result is None]
+        if not missing:
+            self._cache_ollama_response(prompt, response)
+        else:
+            self._evict_ollama_response(prompt)
+            self.logger.debug(f"Пакетная генерация не вернула метаданные для {len(missing)} shorts")
+        for i in missing:
+            results[i] = self._generate_short_metadata(video_info, segments[i])
+        
+        return results
     
     def _generate_short_metadata(self, video_info: Dict, segment: Dict) -> Tuple[str, str]:
         """Генерация названия и описания для short через ИИ"""
@@ -635,12 +1389,18 @@ class ShortsCreator:
                 title = "Short из " + video_info['title'][:30]
                 description = segment.get('description', '')
                 
+                parsed = False
                 for line in lines:
                     if line.startswith('Название:'):
                         title = line.replace('Название:', '').strip()
+                        parsed = True
                     elif line.startswith('Описание:'):
                         description = line.replace('Описание:', '').strip()
                 
+                if parsed:
+                    self._cache_ollama_response(prompt, response)
+                else:
+                    self._evict_ollama_response(prompt)
                 return title, description
         except Exception as e:
             self.logger.warning(f"⚠️ Ошибка при генерации метаданных: {e}")
@@ -649,19 +1409,30 @@ class ShortsCreator:
     
     def _sanitize_filename(self, filename: str) -> str:
         """Очистка имени файла от недопустимых символов"""
-        import re
-        return re.sub(r'[<>:"/\\|?*]', '_', filename)[:50]
+        return filename.translate(_BAD_CHARS_TABLE)[:50]
     
     def cleanup_temp_files(self):
         """Очистка временных файлов"""
         if not self.config['processing']['preserve_temp_files']:
-            temp_dir = Path(self.config['paths']['temp_dir'])
-            for file in temp_dir.glob('*'):
+            temp_dir = self.config['paths']['temp_dir']
+            try:
+                with os.scandir(temp_dir) as it:
+                    paths = [entry.path for entry in it if entry.is_file()]
+            except OSError as e:
+                # Нет каталога — нечего удалять
+                self.logger.debug(f"Не удалось прочитать {temp_dir}: {e}")
+                return
+            
+            def unlink(path: str):
                 try:
-                    file.unlink()
-                    self.logger.debug(f"🗑️ Удален временный файл: {file.name}")
-                except Exception as e:
-                    self.logger.warning(f"⚠️ Не удалось удалить {file.name}: {e}")
+                    os.unlink(path)
+                    self.logger.debug(f"🗑️ Удален временный файл: {os.path.basename(path)}")
+                except OSError as e:
+                    self.logger.warning(f"⚠️ Не удалось удалить {os.path.basename(path)}: {e}")
+            
+            # Удаления независимы: выполняем их параллельно
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(unlink, paths))
     
     def print_statistics(self):
         """Вывод статистики обработки"""
@@ -674,6 +1445,9 @@ class ShortsCreator:
         print(f"✂️ Создано shorts: {self.stats['shorts_created']}")
         print(f"❌ Ошибок: {self.stats['errors']}")
         
+        if self.stats['ollama_cache_hits'] or self.stats['ollama_cache_misses']:
+            print(f"♻️ Кэш Ollama: {self.stats['ollama_cache_hits']} попаданий, {self.stats['ollama_cache_misses']} промахов")
+        
         if self.stats['shorts_created'] > 0:
             print(f"\n{Fore.CYAN}🎉 Shorts успешно созданы! Проверьте папку: {self.config['paths']['output_dir']}{Style.RESET_ALL}")
     
@@ -686,7 +1460,7 @@ class ShortsCreator:
                 return False
             
             video_info['url'] = url
-            self.stats['videos_processed'] += 1
+            self._inc_stat('videos_processed')
             
             # 2. Извлечение аудио и транскрипция
             audio_data = self.extract_audio_and_subtitles(video_info)
@@ -712,12 +1486,140 @@ class ShortsCreator:
             
         except Exception as e:
             self.logger.error(f"❌ Критическая ошибка при обработке видео: {e}")
-            self.stats['errors'] += 1
+            self._inc_stat('errors')
             return False
         finally:
             # Очистка временных файлов
             self.cleanup_temp_files()
 
+    def process_videos(self, inputs: List[str]) -> int:
+        """Конвейерная обработка нескольких видео
+        
+        Скачивание, извлечение аудио, транскрипция с анализом и нарезка
+        выполняются в отдельных потоках и связаны ограниченными очередями,
+        поэтому этапы разных видео перекрываются по времени.
+        Возвращает количество успешно обработанных видео.
+        """
+        succeeded = []
+        download_q = queue.Queue()
+        extract_q = queue.Queue(maxsize=2)
+        transcribe_q = queue.Queue(maxsize=2)
+        encode_q = queue.Queue(maxsize=2)
+        
+        def download(url: str) -> Optional[Dict]:
+            video_info = self.download_video(url)
+            if not video_info:
+                return None
+            video_info['url'] = url
+            self._inc_stat('videos_processed')
+            return {'video_info': video_info}
+        
+        def extract(job: Dict) -> Optional[Dict]:
+            job['audio_path'] = self.extract_audio(job['video_info'])
+            return job if job['audio_path'] else None
+        
+        def transcribe(job: Dict) -> Optional[Dict]:
+            audio_data = self.transcribe_audio(job['audio_path'])
+            if not audio_data:
+                return None
+            job['segments'] = self.analyze_content_with_ai(job['video_info'], audio_data)
+            if not job['segments']:
+                self.logger.error(f"❌ Не удалось определить сегменты для нарезки: {job['video_info']['url']}")
+                return None
+            return job
+        
+        def encode(job: Dict) -> Optional[Dict]:
+            video_info = job['video_info']
+            output_files = self.create_shorts(video_info, job['segments'])
+            if not output_files:
+                return None
+            if self.config['features']['auto_generate_descriptions']:
+                self.generate_metadata(video_info, job['segments'], output_files)
+            succeeded.append(video_info['url'])
+            return None
+        
+        stages = [
+            (download, download_q, extract_q),
+            (extract, extract_q, transcribe_q),
+            (transcribe, transcribe_q, encode_q),
+            (encode, encode_q, None)
+        ]
+        workers = [
+            threading.Thread(target=self._pipeline_worker, args=stage, daemon=True)
+            for stage in stages
+        ]
+        
+        for url in inputs:
+            download_q.put(url)
+        download_q.put(None)
+        
+        try:
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        finally:
+            # Очистка временных файлов после завершения всех этапов
+            self.cleanup_temp_files()
+        
+        return len(succeeded)
+    
+    def _pipeline_worker(self, func: Callable[[object], Optional[object]],
+                         in_queue: queue.Queue, out_queue: Optional[queue.Queue]):
+        """Этап конвейера: обрабатывает элементы очереди до получения None"""
+        while True:
+            item = in_queue.get()
+            if item is None:
+                if out_queue is not None:
+                    out_queue.put(None)
+                return
+            
+            try:
+                result = func(item)
+            except Exception as e:
+                self.logger.error(f"❌ Критическая ошибка при обработке видео: {e}")
+                self._inc_stat('errors')
+                result = None
+            
+            if result is not None and out_queue is not None:
+                out_queue.put(result)
+
+def run_client(config_path: str, inputs: List[str]) -> bool:
+    """Отправка заданий запущенному серверу (main.py --serve)"""
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            server_config = json.load(f)['server']
+    except (OSError, json.JSONDecodeError, KeyError) as e:
+        print(f"❌ Не удалось прочитать настройки сервера из {config_path}: {e}")
+        return False
+    
+    try:
+        authkey = _server_authkey(server_config)
+    except (ValueError, OSError) as e:
+        print(f"❌ Не удалось получить ключ сервера: {e}")
+        return False
+    
+    address = (server_config['host'], server_config['port'])
+    try:
+        with Client(address, authkey=authkey) as conn:
+            # Сервер может работать в другой директории: локальные пути передаем абсолютными
+            conn.send({'inputs': [os.path.abspath(i) if os.path.exists(i) else i for i in inputs]})
+            reply = conn.recv()
+    except (OSError, EOFError, AuthenticationError) as e:
+        print(f"❌ Не удалось связаться с сервером {address[0]}:{address[1]}: {e}")
+        return False
+    
+    stats = reply['stats']
+    print(f"\n{Fore.GREEN}📊 Статистика обработки:{Style.RESET_ALL}")
+    print(f"📹 Обработано видео: {stats['videos_processed']}")
+    print(f"✂️ Создано shorts: {stats['shorts_created']}")
+    print(f"❌ Ошибок: {stats['errors']}")
+    
+    if stats['shorts_created'] > 0:
+        print(f"\n{Fore.CYAN}🎉 Shorts успешно созданы! Проверьте папку: {reply['output_dir']}{Style.RESET_ALL}")
+    
+    return reply['success']
+
 def main():
     """Главная функция"""
     parser = argparse.ArgumentParser(
@@ -727,19 +1629,32 @@ def main():
 Примеры использования:
   python main.py https://www.youtube.com/watch?v=VIDEO_ID
   python main.py --config custom_config.json https://youtu.be/VIDEO_ID
+  python main.py https://youtu.be/VIDEO_1 https://youtu.be/VIDEO_2 ./local_video.mp4
+  python main.py --serve
+  python main.py --client https://youtu.be/VIDEO_ID
   python main.py --help
 
 Автор: SkvorikovCode (2025)
         """
     )
     
-    parser.add_argument('input', help='URL YouTube видео или путь к локальному видеофайлу для обработки')
+    parser.add_argument('input', nargs='*', help='URL YouTube видео или пути к локальным видеофайлам для обработки')
     parser.add_argument('--config', '-c', default='config.json', help='Путь к файлу конфигурации')
     parser.add_argument('--verbose', '-v', action='store_true', help='Подробный вывод')
+    parser.add_argument('--serve', action='store_true', help='Запустить сервер с постоянно загруженной моделью Whisper')
+    parser.add_argument('--client', action='store_true', help='Отправить видео на обработку запущенному серверу')
     parser.add_argument('--version', action='version', version='YouTube Shorts Creator 1.0.0')
     
     args = parser.parse_args()
     
+    if args.serve and args.client:
+        parser.error('--serve и --client нельзя использовать одновременно')
+    if not args.serve and not args.input:
+        parser.error('укажите хотя бы один URL или путь к видеофайлу')
+    
+    if args.client:
+        sys.exit(0 if run_client(args.config, args.input) else 1)
+    
     try:
         # Создание экземпляра приложения
         creator = ShortsCreator(args.config)
@@ -751,8 +1666,14 @@ def main():
         # Вывод баннера
         creator.print_banner()
         
-        # Обработка видео
-        success = creator.process_video(args.input)
+        if args.serve:
+            sys.exit(0 if creator.serve() else 1)
+        
+        # Обработка видео: несколько входов обрабатываются конвейером
+        if len(args.input) == 1:
+            success = creator.process_video(args.input[0])
+        else:
+            success = creator.process_videos(args.input) == len(args.input)
         
         # Вывод статистики
         creator.print_statistics()